@@ -1,6 +1,6 @@
 import threading
 import time
-import math
+import struct
 
 # Try XInput first (Windows), fallback to inputs (Linux)
 HAS_XINPUT = False
@@ -20,6 +20,37 @@ if not HAS_XINPUT:
     except ImportError:
         pass
 
+# Indices into GamepadController._state
+_LX, _LY, _TL, _TR = range(4)
+
+# struct js_event: time(4 bytes), value(2 bytes), type(1 byte), number(1 byte)
+_JS_EVT = struct.Struct('IhBB')
+JS_READ_SIZE = _JS_EVT.size * 64  # Drain up to 64 queued events per read
+
+# Reciprocals so the hot paths multiply instead of divide
+_INV_MAX_ABS = 1.0 / 32767.0
+_INV_MAX_TRIG = 1.0 / 255.0
+
+# Read-error backoff (seconds): doubles per consecutive failure, resets on success
+BACKOFF_MIN = 0.05
+BACKOFF_MAX = 1.0
+
+# Axis dispatch: code -> (state index, scale, offset, apply deadzone)
+# inputs library codes (sticks -32767..32767, triggers 0..255)
+_INPUTS_AXIS_MAP = {
+    'ABS_X':  (_LX,  _INV_MAX_ABS,  0.0, True),
+    'ABS_Y':  (_LY, -_INV_MAX_ABS,  0.0, True),   # Inverted
+    'ABS_Z':  (_TL,  _INV_MAX_TRIG, 0.0, False),
+    'ABS_RZ': (_TR,  _INV_MAX_TRIG, 0.0, False),
+}
+# /dev/input/js0 axis numbers (triggers -32767..32767 mapped to 0..1)
+_JS_AXIS_MAP = {
+    0: (_LX,  _INV_MAX_ABS,       0.0, True),   # Left Stick X
+    1: (_LY, -_INV_MAX_ABS,       0.0, True),   # Left Stick Y (inverted)
+    2: (_TL,  0.5 * _INV_MAX_ABS, 0.5, False),  # Left Trigger
+    5: (_TR,  0.5 * _INV_MAX_ABS, 0.5, False),  # Right Trigger
+}
+
 class GamepadController:
     """
     Reads inputs from a connected Gamepad (e.g. PS4/PS5/Xbox/EvoFox).
@@ -35,11 +66,10 @@ class GamepadController:
         self.max_steer = max_steer
         self.max_throttle = max_throttle
         
-        # State Mapping
-        self._norm_lx = 0.0
-        self._norm_ly = 0.0
-        self._trig_l = 0.0
-        self._trig_r = 0.0
+        # State Mapping: (lx, ly, trig_l, trig_r) swapped as one immutable
+        # tuple so readers never see a half-updated stick/trigger set
+        self._state_lock = threading.Lock()
+        self._state = (0.0, 0.0, 0.0, 0.0)
         
         # Detect library
         if HAS_XINPUT:
@@ -67,17 +97,18 @@ class GamepadController:
         Throttle: -1.0 (Backward) to 1.0 (Forward)
         Steering: -1.0 (Left) to 1.0 (Right)
         """
+        with self._state_lock:
+            lx, ly, bwd, fwd = self._state
+
         # Steering from Left Stick X
-        steer_cmd = self._norm_lx * self.max_steer
+        steer_cmd = lx * self.max_steer
         
         # Throttle logic: R2 - L2
-        fwd = self._trig_r
-        bwd = self._trig_l
         throt_cmd = (fwd - bwd) * self.max_throttle
         
         # Fallback: If triggers aren't used, use Left Stick Y
         if abs(throt_cmd) < 0.01:
-             throt_cmd = self._norm_ly * self.max_throttle
+             throt_cmd = ly * self.max_throttle
 
         return throt_cmd, steer_cmd
 
@@ -91,25 +122,46 @@ class GamepadController:
 
     def _run_xinput_loop(self):
         """XInput-based loop for Windows"""
+        last_packet = -1
+        last_change = time.time()
+        backoff = BACKOFF_MIN
         while self.running:
             try:
                 # Get state from first connected controller
                 state = XInput.get_state(0)
                 
-                # Left Stick (normalized -1 to 1)
-                lx = state.Gamepad.sThumbLX / 32767.0
-                ly = state.Gamepad.sThumbLY / 32767.0
+                # dwPacketNumber only changes when the controller state does
+                if state.dwPacketNumber == last_packet:
+                    # Poll at 100 Hz, dropping to 50 Hz after 0.5s of no input
+                    idle = time.time() - last_change > 0.5
+                    time.sleep(0.02 if idle else 0.01)
+                    continue
+                last_packet = state.dwPacketNumber
+                last_change = time.time()
                 
-                self._norm_lx = self._apply_deadzone(lx)
-                self._norm_ly = self._apply_deadzone(ly)
+                gp = state.Gamepad
+                dz = self.deadzone
+                
+                # Left Stick (normalized -1 to 1, deadzone inlined)
+                lx = gp.sThumbLX * _INV_MAX_ABS
+                ly = gp.sThumbLY * _INV_MAX_ABS
+                if -dz < lx < dz:
+                    lx = 0.0
+                if -dz < ly < dz:
+                    ly = 0.0
                 
                 # Triggers (normalized 0 to 1)
-                self._trig_l = state.Gamepad.bLeftTrigger / 255.0
-                self._trig_r = state.Gamepad.bRightTrigger / 255.0
+                tl = gp.bLeftTrigger * _INV_MAX_TRIG
+                tr = gp.bRightTrigger * _INV_MAX_TRIG
+                
+                new_state = (lx, ly, tl, tr)
+                with self._state_lock:
+                    self._state = new_state
                 
+                backoff = BACKOFF_MIN
                 time.sleep(0.01)
             except Exception as e:
-                time.sleep(0.5)
+                backoff = self._backoff(backoff, e)
 
     def _run_inputs_loop(self):
         """inputs library loop for Linux - with fallback to direct read"""
@@ -134,62 +186,76 @@ class GamepadController:
     def _run_inputs_events(self):
         """Read using inputs library"""
         from inputs import get_gamepad
+        backoff = BACKOFF_MIN
         while self.running:
             try:
                 events = get_gamepad()
+                backoff = BACKOFF_MIN
                 for event in events:
                     self._process_inputs_event(event)
             except Exception as e:
-                time.sleep(0.5)
+                backoff = self._backoff(backoff, e)
 
     def _run_direct_joystick(self):
         """Direct read from /dev/input/js0 - Linux only"""
-        import struct
+        import os
         
-        JS_EVENT_SIZE = 8  # sizeof(struct js_event)
         JS_EVENT_BUTTON = 0x01
         JS_EVENT_AXIS = 0x02
         
         try:
-            with open('/dev/input/js0', 'rb') as js:
-                while self.running:
-                    event = js.read(JS_EVENT_SIZE)
-                    if event:
-                        # Unpack: time(4 bytes), value(2 bytes), type(1 byte), number(1 byte)
-                        _, value, ev_type, number = struct.unpack('IhBB', event)
-                        
-                        # Handle axis events
-                        if ev_type & JS_EVENT_AXIS:
-                            normalized = value / 32767.0
-                            
-                            if number == 0:  # Left Stick X
-                                self._norm_lx = self._apply_deadzone(normalized)
-                            elif number == 1:  # Left Stick Y
-                                self._norm_ly = self._apply_deadzone(-normalized)
-                            elif number == 2:  # Left Trigger
-                                self._trig_l = (normalized + 1.0) / 2.0  # Convert -1..1 to 0..1
-                            elif number == 5:  # Right Trigger
-                                self._trig_r = (normalized + 1.0) / 2.0
+            fd = os.open('/dev/input/js0', os.O_RDONLY)
         except Exception as e:
             print(f"Joystick error: {e}")
+            return
+        
+        # Local bindings for the per-event path
+        read = os.read
+        iter_unpack = _JS_EVT.iter_unpack
+        axis_entry = _JS_AXIS_MAP.get
+        apply_axis = self._apply_axis
+        
+        try:
+            while self.running:
+                # One syscall returns every event queued so far (always whole events)
+                data = read(fd, JS_READ_SIZE)
+                for _, value, ev_type, number in iter_unpack(data):
+                    # Handle axis events
+                    if ev_type & JS_EVENT_AXIS:
+                        apply_axis(axis_entry(number), value)
+        except Exception as e:
+            print(f"Joystick error: {e}")
+        finally:
+            os.close(fd)
+
+    def _backoff(self, delay, error):
+        """Sleep after a read error and return the next (doubled) delay."""
+        if delay == BACKOFF_MIN:
+            print(f"Gamepad read error: {error}")  # Report once per failure streak
+        time.sleep(delay)
+        return min(delay * 2, BACKOFF_MAX)
 
     def _process_inputs_event(self, event):
-        MAX_ABS = 32767.0
-        MAX_TRIG = 255.0
-        
-        if event.code == 'ABS_X':
-            self._norm_lx = self._apply_deadzone(event.state / MAX_ABS)
-        elif event.code == 'ABS_Y':
-            self._norm_ly = self._apply_deadzone(-event.state / MAX_ABS)
-        elif event.code == 'ABS_Z':
-            self._trig_l = event.state / MAX_TRIG
-        elif event.code == 'ABS_RZ':
-            self._trig_r = event.state / MAX_TRIG
+        self._apply_axis(_INPUTS_AXIS_MAP.get(event.code), event.state)
+
+    def _apply_axis(self, entry, raw):
+        """Normalize a raw axis value using an _*_AXIS_MAP entry (None = unmapped)."""
+        if entry is None:
+            return
+        idx, scale, offset, deadzone = entry
+        val = raw * scale + offset
+        if deadzone:
+            dz = self.deadzone
+            if -dz < val < dz:
+                val = 0.0
+        self._set_state(idx, val)
 
-    def _apply_deadzone(self, val):
-        if abs(val) < self.deadzone:
-            return 0.0
-        return val
+    def _set_state(self, idx, value):
+        """Replace one entry of the shared state tuple."""
+        with self._state_lock:
+            state = list(self._state)
+            state[idx] = value
+            self._state = tuple(state)
 
 
 # Test mode
@@ -16,9 +16,11 @@ Controller Mapping:
 Supports: XInput (Windows), direct /dev/input/js0 (Linux)
 """
 
+import os
+import struct
 import threading
 import time
-import math
+from array import array
 
 # Try XInput first (Windows), fallback to inputs (Linux)
 HAS_XINPUT = False
@@ -37,6 +39,82 @@ if not HAS_XINPUT:
     except ImportError:
         pass
 
+# Read-error backoff (seconds): doubles per consecutive failure, resets on success
+BACKOFF_MIN = 0.05
+BACKOFF_MAX = 1.0
+
+# Linux joystick API: struct js_event = time(u32), value(s16), type(u8), number(u8)
+_JS_EVENT = struct.Struct('IhBB')
+JS_EVENT_SIZE = _JS_EVENT.size
+JS_EVENT_BUTTON = 0x01
+JS_EVENT_AXIS = 0x02
+JS_READ_SIZE = JS_EVENT_SIZE * 64  # Up to 64 queued events per read syscall
+JS_DEVICE = '/dev/input/js0'
+JS_REOPEN_INTERVAL = 1.0  # Seconds between open attempts while unplugged
+
+# Slots in UGVGamepadController._axes (same numbering as js0 axes)
+AX_LX, AX_LY, AX_LT, AX_RX, AX_RY, AX_RT = range(6)
+
+# js0 axis number -> (scale, offset) into the _axes convention
+_JS_AXIS_TABLE = (
+    ( 1.0 / 32767.0, 0.0),  # 0: Left Stick X
+    (-1.0 / 32767.0, 0.0),  # 1: Left Stick Y (inverted)
+    ( 0.5 / 32767.0, 0.5),  # 2: Left Trigger (-1..1 -> 0..1)
+    ( 1.0 / 32767.0, 0.0),  # 3: Right Stick X
+    (-1.0 / 32767.0, 0.0),  # 4: Right Stick Y (inverted)
+    ( 0.5 / 32767.0, 0.5),  # 5: Right Trigger (-1..1 -> 0..1)
+)
+
+# Canonical button numbers are the js0 ones; buttons that mirror their
+# held state onto a controller attribute
+_HELD_BUTTONS = {
+    1: 'emergency_stop',  # B
+    3: 'horn',            # Y
+}
+
+# XInput wButtons mask -> canonical (js0) button number
+_XINPUT_BUTTON_MAP = (
+    (0x1000, 0),   # A
+    (0x2000, 1),   # B
+    (0x4000, 2),   # X
+    (0x8000, 3),   # Y
+    (0x0001, 11),  # D-Pad Up
+    (0x0002, 12),  # D-Pad Down
+    (0x0004, 13),  # D-Pad Left
+    (0x0008, 14),  # D-Pad Right
+)
+
+
+def _compute_wheels(lx, ly, lt, rt, max_speed, deadzone):
+    """
+    Arcade-drive mix of raw axes into (left, right, speed_multiplier).
+    Pure function of its float arguments so it can be tested or compiled
+    on its own.
+    """
+    if -deadzone < lx < deadzone:
+        lx = 0.0
+    if -deadzone < ly < deadzone:
+        ly = 0.0
+    
+    # Speed multiplier: RT = boost, LT = slow (clamped 0.2-1.0)
+    mult = 0.5 + (rt * 0.5) - (lt * 0.3)
+    mult = 0.2 if mult < 0.2 else (1.0 if mult > 1.0 else mult)
+    
+    # Arcade drive mixing
+    scaled = max_speed * mult
+    forward = ly * scaled
+    turn = lx * scaled * 0.7
+    
+    left = forward + turn
+    right = forward - turn
+    
+    # Clamp to max speed
+    lim = max_speed
+    left = lim if left > lim else (-lim if left < -lim else left)
+    right = lim if right > lim else (-lim if right < -lim else right)
+    
+    return left, right, mult
+
 
 class UGVGamepadController:
     """
@@ -44,7 +122,7 @@ class UGVGamepadController:
     Outputs commands for chassis, PTZ, and accessories.
     """
     
-    def __init__(self, deadzone=0.15, max_speed=0.35):
+    def __init__(self, deadzone=0.15, max_speed=0.35, poll_interval=0.02):
         # Movement state
         self.left_wheel = 0.0  # -1.0 to 1.0
         self.right_wheel = 0.0
@@ -66,21 +144,33 @@ class UGVGamepadController:
         self.deadzone = deadzone
         self.max_speed = max_speed  # m/s (UGV max is 0.35)
         self.speed_multiplier = 1.0  # Controlled by triggers
+        self.poll_interval = poll_interval  # XInput state poll period (s)
+        
+        # Raw inputs: latest normalized value per axis, no deadzone applied.
+        # Readers only store here; deadzone/speed math runs once per
+        # get_*_command call instead of once per (jittery) axis event.
+        # Sticks -1..1 (Y up = +), triggers 0..1
+        self._axes = array('f', [0.0] * 6)
         
-        # Raw inputs
-        self._lx = 0.0
-        self._ly = 0.0
-        self._rx = 0.0
-        self._ry = 0.0
-        self._lt = 0.0
-        self._rt = 0.0
+        # Button state as a bitmask: bit N set while canonical button N is held
+        self._btn_mask = 0
         
-        # Button states (for edge detection)
-        self._buttons = {}
-        self._prev_buttons = {}
+        # Canonical button number -> action on press (edge)
+        self._press_handlers = {
+            0: self._press_center_ptz,       # A
+            2: self._toggle_stabilize,       # X
+            11: self._toggle_main_led,       # D-Pad Up
+            12: self._toggle_main_led,       # D-Pad Down
+            13: self._toggle_chassis_led,    # D-Pad Left
+            14: self._toggle_chassis_led,    # D-Pad Right
+        }
         
-        # Thread control
-        self.running = False
+        # Thread control: stop() sets the event and pokes the self-pipe so a
+        # reader blocked in select()/wait() returns immediately
+        self._stop_event = threading.Event()
+        # Self-pipe for the js0 loop; owned by start()/stop(), not the thread
+        self._wake_r = None
+        self._wake_w = None
         self.thread = None
         
         # Detect library
@@ -93,32 +183,37 @@ class UGVGamepadController:
 
     def start(self):
         """Start the input reading thread."""
-        self.running = True
+        self._stop_event.clear()
+        self._wake_r, self._wake_w = os.pipe()
         self.thread = threading.Thread(target=self._run_loop, daemon=True)
         self.thread.start()
         print("[UGV Gamepad] Controller thread started")
 
     def stop(self):
-        self.running = False
+        self._stop_event.set()
+        if self._wake_w is not None:
+            try:
+                os.write(self._wake_w, b'x')
+            except OSError:
+                pass  # Pipe full: the loop is already being woken
         if self.thread:
             self.thread.join(timeout=1.0)
+            if self.thread.is_alive():
+                return  # Still using the pipe; leave it open (daemon thread)
+        if self._wake_w is not None:
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._wake_r = self._wake_w = None
 
     def get_chassis_command(self):
         """
         Returns (left_speed, right_speed) in m/s
         Uses differential drive: left stick controls arcade-style
         """
-        # Arcade drive mixing
-        forward = self._ly * self.max_speed * self.speed_multiplier
-        turn = self._lx * self.max_speed * self.speed_multiplier * 0.7
-        
-        left = forward + turn
-        right = forward - turn
-        
-        # Clamp to max speed
-        left = max(-self.max_speed, min(self.max_speed, left))
-        right = max(-self.max_speed, min(self.max_speed, right))
-        
+        axes = self._axes
+        left, right, self.speed_multiplier = _compute_wheels(
+            axes[AX_LX], axes[AX_LY], axes[AX_LT], axes[AX_RT],
+            self.max_speed, self.deadzone)
         return left, right
 
     def get_ptz_command(self):
@@ -127,21 +222,24 @@ class UGVGamepadController:
         pan_dir: -1 (left), 0 (stop), 1 (right)
         tilt_dir: -1 (down), 0 (stop), 1 (up)
         """
+        rx = self._apply_deadzone(self._axes[AX_RX])
+        ry = self._apply_deadzone(self._axes[AX_RY])
+        
         # Convert analog to direction
         pan = 0
-        if self._rx > 0.5:
+        if rx > 0.5:
             pan = 1
-        elif self._rx < -0.5:
+        elif rx < -0.5:
             pan = -1
             
         tilt = 0
-        if self._ry > 0.5:
+        if ry > 0.5:
             tilt = 1
-        elif self._ry < -0.5:
+        elif ry < -0.5:
             tilt = -1
         
         # Speed based on stick magnitude
-        speed = int(max(abs(self._rx), abs(self._ry)) * 100)
+        speed = int(max(abs(rx), abs(ry)) * 100)
         speed = max(20, min(100, speed))  # Clamp 20-100
         
         return pan, tilt, speed
@@ -162,6 +260,7 @@ class UGVGamepadController:
         return self.emergency_stop
 
     def _run_loop(self):
+        self._boost_priority()
         if HAS_XINPUT:
             self._run_xinput_loop()
         elif HAS_INPUTS:
@@ -171,138 +270,189 @@ class UGVGamepadController:
 
     def _run_xinput_loop(self):
         """XInput-based loop for Windows"""
-        while self.running:
+        backoff = BACKOFF_MIN
+        last_packet = -1
+        while not self._stop_event.is_set():
             try:
                 state = XInput.get_state(0)
+                
+                # XInput has no blocking read; dwPacketNumber only changes
+                # when the pad state does, so skip all work until it moves
+                if state.dwPacketNumber == last_packet:
+                    self._stop_event.wait(self.poll_interval)
+                    continue
+                last_packet = state.dwPacketNumber
                 gp = state.Gamepad
                 
                 # Sticks (normalized -1 to 1)
-                self._lx = self._apply_deadzone(gp.sThumbLX / 32767.0)
-                self._ly = self._apply_deadzone(gp.sThumbLY / 32767.0)
-                self._rx = self._apply_deadzone(gp.sThumbRX / 32767.0)
-                self._ry = self._apply_deadzone(gp.sThumbRY / 32767.0)
+                axes = self._axes
+                axes[AX_LX] = gp.sThumbLX / 32767.0
+                axes[AX_LY] = gp.sThumbLY / 32767.0
+                axes[AX_RX] = gp.sThumbRX / 32767.0
+                axes[AX_RY] = gp.sThumbRY / 32767.0
                 
                 # Triggers (normalized 0 to 1)
-                self._lt = gp.bLeftTrigger / 255.0
-                self._rt = gp.bRightTrigger / 255.0
-                
-                # Speed multiplier: RT = boost, LT = slow
-                self.speed_multiplier = 0.5 + (self._rt * 0.5) - (self._lt * 0.3)
-                self.speed_multiplier = max(0.2, min(1.0, self.speed_multiplier))
+                axes[AX_LT] = gp.bLeftTrigger / 255.0
+                axes[AX_RT] = gp.bRightTrigger / 255.0
                 
-                # Buttons (using XInput button masks)
+                # Buttons: translate XInput masks to canonical numbering
                 buttons = gp.wButtons
+                mask = 0
+                for xmask, number in _XINPUT_BUTTON_MAP:
+                    if buttons & xmask:
+                        mask |= 1 << number
+                self._set_buttons(mask)
                 
-                # D-Pad toggle LEDs (edge detection)
-                if self._button_pressed(buttons, 0x0001):  # D-Pad Up
-                    self.main_led = not self.main_led
-                if self._button_pressed(buttons, 0x0002):  # D-Pad Down
-                    self.main_led = not self.main_led
-                if self._button_pressed(buttons, 0x0004):  # D-Pad Left
-                    self.chassis_led = not self.chassis_led
-                if self._button_pressed(buttons, 0x0008):  # D-Pad Right
-                    self.chassis_led = not self.chassis_led
-                
-                # A Button = Center PTZ
-                if self._button_pressed(buttons, 0x1000):
-                    self.center_ptz = True
-                
-                # B Button = Emergency Stop (held)
-                self.emergency_stop = bool(buttons & 0x2000)
-                
-                # X Button = Toggle stabilization
-                if self._button_pressed(buttons, 0x4000):
-                    self.stabilize_camera = not self.stabilize_camera
-                
-                # Y Button = Horn (held)
-                self.horn = bool(buttons & 0x8000)
-                
-                self._prev_buttons = buttons
-                time.sleep(0.02)
+                backoff = BACKOFF_MIN
+                self._stop_event.wait(self.poll_interval)
                 
             except Exception as e:
-                time.sleep(0.5)
+                backoff = self._backoff(backoff, e)
 
     def _run_linux_loop(self):
-        """Direct joystick read for Linux"""
-        import os
-        import struct
-        
-        if not os.path.exists('/dev/input/js0'):
-            print("[UGV Gamepad] ERROR: /dev/input/js0 not found!")
-            return
+        """Direct joystick read for Linux, re-attaching if js0 is unplugged"""
+        import selectors
         
-        JS_EVENT_SIZE = 8
-        JS_EVENT_BUTTON = 0x01
-        JS_EVENT_AXIS = 0x02
+        # Self-pipe (from start()) that stop() writes to, so select() can
+        # block until there is real work; shared across device re-opens
+        wake_r = self._wake_r
+        sel = selectors.DefaultSelector()
+        sel.register(wake_r, selectors.EVENT_READ)
         
+        reported_missing = False
         try:
-            with open('/dev/input/js0', 'rb') as js:
-                while self.running:
-                    event = js.read(JS_EVENT_SIZE)
-                    if event:
-                        _, value, ev_type, number = struct.unpack('IhBB', event)
-                        
-                        if ev_type & JS_EVENT_AXIS:
-                            normalized = value / 32767.0
-                            
-                            if number == 0:  # Left Stick X
-                                self._lx = self._apply_deadzone(normalized)
-                            elif number == 1:  # Left Stick Y (inverted)
-                                self._ly = self._apply_deadzone(-normalized)
-                            elif number == 3:  # Right Stick X
-                                self._rx = self._apply_deadzone(normalized)
-                            elif number == 4:  # Right Stick Y (inverted)
-                                self._ry = self._apply_deadzone(-normalized)
-                            elif number == 2:  # Left Trigger
-                                self._lt = (normalized + 1.0) / 2.0
-                            elif number == 5:  # Right Trigger
-                                self._rt = (normalized + 1.0) / 2.0
-                                
-                            # Update speed multiplier
-                            self.speed_multiplier = 0.5 + (self._rt * 0.5) - (self._lt * 0.3)
-                            self.speed_multiplier = max(0.2, min(1.0, self.speed_multiplier))
-                        
-                        elif ev_type & JS_EVENT_BUTTON:
-                            btn_name = f"btn_{number}"
-                            was_pressed = self._buttons.get(btn_name, 0)
-                            self._buttons[btn_name] = value
-                            
-                            # Edge detection (button just pressed)
-                            if value == 1 and was_pressed == 0:
-                                if number == 0:  # A
-                                    self.center_ptz = True
-                                elif number == 2:  # X
-                                    self.stabilize_camera = not self.stabilize_camera
-                                elif number == 11:  # D-Pad Up
-                                    self.main_led = not self.main_led
-                                elif number == 12:  # D-Pad Down
-                                    self.main_led = not self.main_led
-                                elif number == 13:  # D-Pad Left
-                                    self.chassis_led = not self.chassis_led
-                                elif number == 14:  # D-Pad Right
-                                    self.chassis_led = not self.chassis_led
-                            
-                            # Held buttons
-                            if number == 1:  # B = Emergency Stop
-                                self.emergency_stop = bool(value)
-                            elif number == 3:  # Y = Horn
-                                self.horn = bool(value)
-                                
+            while not self._stop_event.is_set():
+                try:
+                    fd = os.open(JS_DEVICE, os.O_RDONLY | os.O_NONBLOCK)
+                except OSError as e:
+                    if not reported_missing:
+                        print(f"[UGV Gamepad] Waiting for {JS_DEVICE}: {e}")
+                        reported_missing = True
+                    self._stop_event.wait(JS_REOPEN_INTERVAL)
+                    continue
+                
+                if reported_missing:
+                    print(f"[UGV Gamepad] {JS_DEVICE} connected")
+                    reported_missing = False
+                sel.register(fd, selectors.EVENT_READ)
+                try:
+                    self._read_js_device(fd, sel, wake_r)
+                except OSError as e:
+                    # ENODEV once the pad is unplugged: drop to neutral and re-attach
+                    print(f"[UGV Gamepad] Lost {JS_DEVICE}: {e}")
+                    self._reset_inputs()
+                finally:
+                    sel.unregister(fd)
+                    os.close(fd)
         except Exception as e:
             print(f"[UGV Gamepad] Error: {e}")
+        finally:
+            sel.close()
+
+    def _read_js_device(self, fd, sel, wake_r):
+        """Process js0 events until stop() is called; raises OSError on device loss."""
+        iter_unpack = _JS_EVENT.iter_unpack
+        process = self._process_js_event
+        while not self._stop_event.is_set():
+            ready = sel.select()
+            if any(key.fd == wake_r for key, _ in ready):
+                return
+            
+            # Drain every queued event before going back to select,
+            # pulling up to 64 events per syscall
+            while True:
+                try:
+                    buf = os.read(fd, JS_READ_SIZE)
+                except BlockingIOError:
+                    break
+                if not buf:
+                    raise OSError("end of file")
+                # The joystick driver only returns whole js_event records
+                for _, value, ev_type, number in iter_unpack(buf):
+                    process(value, ev_type, number)
+                if len(buf) < JS_READ_SIZE:
+                    break  # Queue is empty
+
+    def _reset_inputs(self):
+        """Return sticks, triggers and held buttons to neutral."""
+        for i in range(len(self._axes)):
+            self._axes[i] = 0.0
+        self._set_buttons(0)
+
+    def _process_js_event(self, value, ev_type, number):
+        """Apply one /dev/input/js0 event to the controller state."""
+        if ev_type & JS_EVENT_AXIS:
+            if number < 6:
+                scale, offset = _JS_AXIS_TABLE[number]
+                self._axes[number] = value * scale + offset
+        
+        elif ev_type & JS_EVENT_BUTTON:
+            bit = 1 << number
+            if value:
+                self._set_buttons(self._btn_mask | bit)
+            else:
+                self._set_buttons(self._btn_mask & ~bit)
+
+    def _set_buttons(self, mask):
+        """Apply a new canonical button bitmask (shared by all backends)."""
+        edges = mask & ~self._btn_mask
+        self._btn_mask = mask
+        
+        # Edge detection (buttons just pressed)
+        if edges:
+            for number, handler in self._press_handlers.items():
+                if edges >> number & 1:
+                    handler()
+        
+        # Held buttons
+        for number, attr in _HELD_BUTTONS.items():
+            setattr(self, attr, bool(mask >> number & 1))
+
+    # --- Button actions (shared by the input backends) ---
+    def _press_center_ptz(self):
+        self.center_ptz = True
+
+    def _toggle_stabilize(self):
+        self.stabilize_camera = not self.stabilize_camera
+
+    def _toggle_main_led(self):
+        self.main_led = not self.main_led
+
+    def _toggle_chassis_led(self):
+        self.chassis_led = not self.chassis_led
+
+    def _boost_priority(self):
+        """Raise this reader thread's scheduling priority on Linux (best effort).
+
+        Tries SCHED_FIFO first (needs root or CAP_SYS_NICE), then a negative
+        nice value. On Linux both apply to the calling thread only.
+        """
+        if not hasattr(os, 'sched_setscheduler'):
+            return  # Windows / macOS
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(20))
+            print("[UGV Gamepad] Reader thread using SCHED_FIFO")
+            return
+        except (OSError, AttributeError):
+            pass
+        try:
+            os.nice(-5)
+            print("[UGV Gamepad] Reader thread niceness raised")
+        except OSError:
+            pass  # Unprivileged: keep default scheduling
+
+    def _backoff(self, delay, error):
+        """Sleep after a read error and return the next (doubled) delay."""
+        if delay == BACKOFF_MIN:
+            print(f"[UGV Gamepad] Read error: {error}")  # Once per failure streak
+        self._stop_event.wait(delay)
+        return min(delay * 2, BACKOFF_MAX)
 
     def _apply_deadzone(self, val):
         if abs(val) < self.deadzone:
             return 0.0
         return val
 
-    def _button_pressed(self, current, mask):
-        """Check if button was just pressed (edge detection)"""
-        was_pressed = bool(self._prev_buttons & mask) if hasattr(self, '_prev_buttons') and isinstance(self._prev_buttons, int) else False
-        is_pressed = bool(current & mask)
-        return is_pressed and not was_pressed
-
 
 # Test mode
 if __name__ == "__main__":
@@ -327,18 +477,23 @@ if __name__ == "__main__":
     print("  Y           : Horn")
     print("\nPress Ctrl+C to exit\n")
     
+    status_fmt = ("Wheels: L={:+.2f} R={:+.2f} | PTZ: P={:+d} T={:+d} | "
+                  "LED: M={} C={} | E-STOP: {}\r").format
+    on_off = ('off', 'ON')
+    estop_text = ('ok', '!!!')
+    write = sys.stdout.write
+    flush = sys.stdout.flush
+    
     try:
         while True:
             left, right = controller.get_chassis_command()
             pan, tilt, ptz_spd = controller.get_ptz_command()
             main_led, chassis_led = controller.get_led_state()
             
-            status = f"Wheels: L={left:+.2f} R={right:+.2f} | "
-            status += f"PTZ: P={pan:+d} T={tilt:+d} | "
-            status += f"LED: M={'ON' if main_led else 'off'} C={'ON' if chassis_led else 'off'} | "
-            status += f"E-STOP: {'!!!' if controller.is_emergency_stop() else 'ok'}"
-            
-            print(status, end='\r')
+            write(status_fmt(left, right, pan, tilt,
+                             on_off[main_led], on_off[chassis_led],
+                             estop_text[controller.is_emergency_stop()]))
+            flush()
             time.sleep(0.05)
             
     except KeyboardInterrupt:
@@ -1,6 +1,16 @@
 import math
 import numpy as np
 
+# Landmark fusion
+MAX_OBSERVATIONS = 10  # Lock position after this many observations
+MERGE_RADIUS = 0.6     # Position-based merge distance (m); also the hash cell size
+LANDMARK_CAPACITY = 64 # Initial landmark array size (doubles when full)
+
+# Heading cache: turns below SMALL_TURN_RAD rotate the cached cos/sin
+# incrementally; recompute exactly at least every HEADING_RESYNC_STEPS
+SMALL_TURN_RAD = 1e-3
+HEADING_RESYNC_STEPS = 100
+
 class MapManagerLaptop:
     """
     Laptop-side SLAM / Mapping.
@@ -17,16 +27,77 @@ class MapManagerLaptop:
         self.cols = int((width_m * 100) / grid_res_cm)
         self.rows = int((height_m * 100) / grid_res_cm)
         
-        self.grid = np.zeros((self.cols, self.rows), dtype=np.float32)
+        # Row-major (H x W): index as grid[iy, ix] so rows are contiguous.
+        # Cells hold occupancy log-odds (0 = unknown) in int8. NumPy int8
+        # arithmetic wraps on overflow, so writers must np.clip to [-128, 127].
+        self.grid = np.zeros((self.rows, self.cols), dtype=np.int8)
         
         # Rover Pose (Start at Bottom-Right Corner)
         # Margin of 20cm from edges to keep it visible
         self.x = width_m - 0.2
         self.y = 0.2
-        self.theta = math.pi / 2 # Facing North
+        self._set_heading(math.pi / 2) # Facing North
+        
+        self._init_landmarks()
         
-        self.craters = []
+        # Per-pixel-column bearing table, built for the first image width seen
+        self._lut_width = None
+        self._lut_cos = None
+        self._lut_sin = None
+
+    def _init_landmarks(self):
+        """
+        Landmarks are stored column-wise (one array per field), indexed by
+        landmark id; only the first crater_id_counter entries are valid.
+        """
         self.crater_id_counter = 0
+        self._lm_x = np.zeros(LANDMARK_CAPACITY, dtype=np.float64)
+        self._lm_y = np.zeros(LANDMARK_CAPACITY, dtype=np.float64)
+        self._lm_radius = np.zeros(LANDMARK_CAPACITY, dtype=np.float64)
+        self._lm_obs = np.zeros(LANDMARK_CAPACITY, dtype=np.int16)
+        self._lm_locked = np.zeros(LANDMARK_CAPACITY, dtype=bool)
+        self._lm_label_id = np.zeros(LANDMARK_CAPACITY, dtype=np.int8)
+        self._lm_label = []     # Label strings, by id
+        self._lm_track = []     # track_id (or None), by id
+        self._label_ids = {}    # label -> small int for _lm_label_id
+        self._track_index = {}  # track_id -> landmark id
+        self._cell_index = {}   # (cell_x, cell_y) -> [landmark ids], cell = MERGE_RADIUS
+        self._craters_cache = None  # Dict view from .craters; None = stale
+
+    def _grow_landmarks(self):
+        """Double the capacity of the landmark arrays."""
+        for name in ('_lm_x', '_lm_y', '_lm_radius', '_lm_obs', '_lm_locked', '_lm_label_id'):
+            old = getattr(self, name)
+            new = np.zeros(len(old) * 2, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    @property
+    def craters(self):
+        """
+        Landmarks as a list of dicts. Rebuilt only after a landmark changed,
+        so telemetry can reuse it between detections; treat as read-only.
+        """
+        if self._craters_cache is not None:
+            return self._craters_cache
+        n = self.crater_id_counter
+        self._craters_cache = [
+            {
+                'id': i,
+                'x': x,
+                'y': y,
+                'radius': radius,
+                'label': label,
+                'track_id': track_id,
+                'observation_count': obs,
+                'locked': locked
+            }
+            for i, (x, y, radius, label, track_id, obs, locked) in enumerate(zip(
+                self._lm_x[:n].tolist(), self._lm_y[:n].tolist(), self._lm_radius[:n].tolist(),
+                self._lm_label, self._lm_track, self._lm_obs[:n].tolist(),
+                self._lm_locked[:n].tolist()))
+        ]
+        return self._craters_cache
 
     def set_kinematics(self, mode):
         if mode in ['jetracer', 'ugv']:
@@ -35,21 +106,31 @@ class MapManagerLaptop:
 
     def reset_map(self):
         """Reset the map state: clear craters and reset pose."""
-        self.craters = []
-        self.crater_id_counter = 0
-        self.grid = np.zeros((self.cols, self.rows), dtype=np.float32)
+        self._init_landmarks()
+        self.grid = np.zeros((self.rows, self.cols), dtype=np.int8)
         
         # Reset Pose to Start (Bottom-Right)
         self.x = self.width_m - 0.2
         self.y = 0.2
-        self.theta = math.pi / 2 # Facing North
+        self._set_heading(math.pi / 2) # Facing North
         print(">> Map Reset!")
 
+    def _set_heading(self, theta):
+        """Set theta and recompute its cached cos/sin exactly."""
+        self.theta = theta
+        self._ct = math.cos(theta)
+        self._st = math.sin(theta)
+        self._heading_steps = 0
+
     def update_pose(self, throttle, steering, dt):
         """
         Dead Reckoning.
         TODO: Fuse with visual odometry if available.
         """
+        # Stopped: no motion to integrate, pose is already in bounds
+        if -1e-4 < throttle < 1e-4 and -1e-4 < steering < 1e-4:
+            return
+        
         # Calibration (Rover specific)
         # Based on measurement: 1.1m in 3s @ 0.3 throttle → 1.1/3/0.3 = 1.22 m/s
         MAX_SPEED_MPS = 1.22
@@ -90,46 +171,64 @@ class MapManagerLaptop:
                 if steering < 0: w = -w
                 
         # Update State
-        self.x += v * math.cos(self.theta) * dt
-        self.y += v * math.sin(self.theta) * dt
-        self.theta += w * dt
+        self.x += v * self._ct * dt
+        self.y += v * self._st * dt
         
-        # Keep in bounds
-        self.x = max(0, min(self.width_m, self.x))
-        self.y = max(0, min(self.height_m, self.y))
+        dtheta = w * dt
+        if dtheta:
+            if -SMALL_TURN_RAD < dtheta < SMALL_TURN_RAD and self._heading_steps < HEADING_RESYNC_STEPS:
+                # Small turn: rotate the cached (cos, sin) to first order
+                ct = self._ct
+                self._ct = ct - self._st * dtheta
+                self._st = self._st + ct * dtheta
+                self.theta += dtheta
+                self._heading_steps += 1
+            else:
+                self._set_heading(self.theta + dtheta)
+        
+        # Keep in bounds (clamp only when actually outside)
+        if not 0 <= self.x <= self.width_m:
+            self.x = max(0, min(self.width_m, self.x))
+        if not 0 <= self.y <= self.height_m:
+            self.y = max(0, min(self.height_m, self.y))
 
     def update_craters(self, visible_craters, img_width):
         """
         Fuse new detections into the map.
         visible_craters: List of dicts {box, depth, label, track_id (optional)}
         """
-        MID_PIX = img_width / 2.0
+        if not visible_craters:
+            return
+        
+        img_width = int(img_width)  # Callers may pass a float; LUT is indexed by column
+        if img_width != self._lut_width:
+            self._build_bearing_lut(img_width)
+        
+        # Robot heading is fixed for the whole batch
+        ct = self._ct
+        st = self._st
+        
+        # Project the whole batch at once; float64 keeps the scalar results
+        boxes = np.array([c['box'] for c in visible_craters], dtype=np.float64)  # [x1, y1, x2, y2]
+        depths = np.array([c['depth'] for c in visible_craters], dtype=np.float64)
+        
+        x_cen = (boxes[:, 0] + boxes[:, 2]) / 2.0
+        
+        # 1. Project to Local Frame (Robot is Origin), bearing by pixel column
+        xi = np.clip(np.rint(x_cen).astype(np.intp), 0, img_width - 1)
+        loc_x = depths * self._lut_cos[xi]
+        loc_y = depths * self._lut_sin[xi]
         
-        for c in visible_craters:
-            box = c['box'] # [x1, y1, x2, y2]
-            depth = c['depth']
+        # 2. Transform to Global Map (tolist -> plain floats for the landmark dicts)
+        gxs = (self.x + (loc_x * ct - loc_y * st)).tolist()
+        gys = (self.y + (loc_x * st + loc_y * ct)).tolist()
+        
+        # 3. Merge one by one (each merge can affect the next)
+        for c, gx, gy in zip(visible_craters, gxs, gys):
             label = c.get('label', 'crater')
             track_id = c.get('track_id', None)  # Use track_id if available
             observation_count = c.get('observation_count', 1)
             
-            x_cen = (box[0] + box[2]) / 2.0
-            
-            # 1. Project to Local Frame (Robot is Origin)
-            x_norm = (x_cen - MID_PIX) / MID_PIX
-            
-            # FOV approx 60 deg -> +/- 30 deg -> +/- 0.5 rad
-            angle_offset = -x_norm * 0.5 # Negate: Left on screen is +Angle
-            
-            d_robot = depth
-            
-            # Local Point:
-            loc_x = d_robot * math.cos(angle_offset)
-            loc_y = d_robot * math.sin(angle_offset)
-            
-            # 2. Transform to Global Map
-            gx = self.x + (loc_x * math.cos(self.theta) - loc_y * math.sin(self.theta))
-            gy = self.y + (loc_x * math.sin(self.theta) + loc_y * math.cos(self.theta))
-            
             # Use segmentation-derived radius if available, else use defaults
             radius = c.get('radius_m', None)
             if radius is None:
@@ -139,60 +238,101 @@ class MapManagerLaptop:
             
             self._add_unique_landmark(gx, gy, radius, label, track_id, observation_count)
 
+    def _build_bearing_lut(self, img_width):
+        """Precompute cos/sin of the camera bearing for every pixel column."""
+        MID_PIX = img_width / 2.0
+        x_norm = (np.arange(img_width, dtype=np.float64) - MID_PIX) / MID_PIX
+        
+        # FOV approx 60 deg -> +/- 30 deg -> +/- 0.5 rad
+        angle_offset = -x_norm * 0.5 # Negate: Left on screen is +Angle
+        
+        self._lut_cos = np.cos(angle_offset)
+        self._lut_sin = np.sin(angle_offset)
+        self._lut_width = img_width
+
+    @staticmethod
+    def _cell_key(x, y):
+        return (math.floor(x / MERGE_RADIUS), math.floor(y / MERGE_RADIUS))
+
+    def _move_landmark(self, i, x, y):
+        """Set landmark i's position, moving it between hash cells if needed."""
+        old_key = self._cell_key(self._lm_x[i], self._lm_y[i])
+        new_key = self._cell_key(x, y)
+        if new_key != old_key:
+            self._cell_index[old_key].remove(i)
+            self._cell_index.setdefault(new_key, []).append(i)
+        self._lm_x[i] = x
+        self._lm_y[i] = y
+
     def _add_unique_landmark(self, x, y, radius, label, track_id=None, observation_count=1):
         """
         Add or update a landmark using track_id for deduplication.
         Landmarks are locked after MAX_OBSERVATIONS to prevent drift.
         """
-        MAX_OBSERVATIONS = 10  # Lock position after this many observations
-        MERGE_RADIUS = 0.6
+        n = self.crater_id_counter
         
         # If we have a track_id, use that for deduplication (most reliable)
         if track_id is not None:
-            for c in self.craters:
-                if c.get('track_id') == track_id:
-                    # Check if locked
-                    if c.get('locked', False):
-                        return  # Don't update locked landmarks
-                    
-                    # Update position (weighted average)
-                    c['x'] = c['x'] * 0.7 + x * 0.3
-                    c['y'] = c['y'] * 0.7 + y * 0.3
-                    c['observation_count'] = c.get('observation_count', 1) + 1
-                    
-                    # Lock after enough observations
-                    if c['observation_count'] >= MAX_OBSERVATIONS:
-                        c['locked'] = True
-                        print(f">> Landmark {c['id']} LOCKED at ({c['x']:.2f}, {c['y']:.2f})")
-                    
-                    return  # Merged
-        
-        # Fallback: position-based merge for landmarks without track_id
-        for c in self.craters:
-            if c.get('label', 'crater') != label:
-                continue
-            if c.get('locked', False):
-                continue  # Don't merge into locked landmarks
+            i = self._track_index.get(track_id)
+            if i is not None:
+                # Check if locked
+                if self._lm_locked[i]:
+                    return  # Don't update locked landmarks
+                
+                # Update position (weighted average)
+                self._craters_cache = None
+                self._move_landmark(i, self._lm_x[i] * 0.7 + x * 0.3, self._lm_y[i] * 0.7 + y * 0.3)
+                self._lm_obs[i] += 1
+                
+                # Lock after enough observations
+                if self._lm_obs[i] >= MAX_OBSERVATIONS:
+                    self._lm_locked[i] = True
+                    print(f">> Landmark {i} LOCKED at ({self._lm_x[i]:.2f}, {self._lm_y[i]:.2f})")
                 
-            dist = math.hypot(c['x'] - x, c['y'] - y)
-            if dist < MERGE_RADIUS:
-                c['x'] = c['x'] * 0.7 + x * 0.3
-                c['y'] = c['y'] * 0.7 + y * 0.3
                 return  # Merged
         
+        # Fallback: position-based merge for landmarks without track_id.
+        # Anything within MERGE_RADIUS lies in the 3x3 cells around (x, y);
+        # test just those in one vectorized pass, oldest unlocked match wins.
+        label_id = self._label_ids.get(label)
+        if label_id is not None:
+            kx, ky = self._cell_key(x, y)
+            cells = self._cell_index
+            cand = [i for ix in (kx - 1, kx, kx + 1) for iy in (ky - 1, ky, ky + 1)
+                    for i in cells.get((ix, iy), ())]
+            if cand:
+                cand = np.array(sorted(cand), dtype=np.intp)
+                dx = self._lm_x[cand] - x
+                dy = self._lm_y[cand] - y
+                match = cand[
+                    (self._lm_label_id[cand] == label_id)
+                    & ~self._lm_locked[cand]
+                    & (dx * dx + dy * dy < MERGE_RADIUS * MERGE_RADIUS)]
+                if match.size:
+                    i = match[0]
+                    self._craters_cache = None
+                    self._move_landmark(i, self._lm_x[i] * 0.7 + x * 0.3, self._lm_y[i] * 0.7 + y * 0.3)
+                    return  # Merged
+        
         # Create new landmark
-        self.craters.append({
-            'id': self.crater_id_counter,
-            'x': x,
-            'y': y,
-            'radius': radius,
-            'label': label,
-            'track_id': track_id,
-            'observation_count': 1,
-            'locked': False
-        })
+        self._craters_cache = None
+        if label_id is None:
+            label_id = self._label_ids[label] = len(self._label_ids)
+        if n == len(self._lm_x):
+            self._grow_landmarks()
+        self._lm_x[n] = x
+        self._lm_y[n] = y
+        self._lm_radius[n] = radius
+        self._lm_obs[n] = 1
+        self._lm_locked[n] = False
+        self._lm_label_id[n] = label_id
+        self._lm_label.append(label)
+        self._lm_track.append(track_id)
+        if track_id is not None:
+            self._track_index[track_id] = n
+        self._cell_index.setdefault(self._cell_key(x, y), []).append(n)
         self.crater_id_counter += 1
-        print(f">> New Landmark {self.crater_id_counter - 1}: {label} at ({x:.2f}, {y:.2f})")
+        print(f">> New Landmark {n}: {label} at ({x:.2f}, {y:.2f})")
 
     def get_status(self):
         return {
@@ -3,21 +3,37 @@
 import time
 import threading
 import cv2
-import requests
+import numpy as np
 import json
-import base64
+import logging
+import logging.handlers
+import queue
 import signal
 import os
 import atexit
 import math
+import sys
 from jetracer.nvidia_racecar import NvidiaRacecar
+from telemetry_sender import TelemetrySender, make_http_session
+
+# Logging: records are written to stdout by a listener thread, so the
+# control loop never blocks on a terminal/pipe write
+LOG_LEVEL = logging.INFO  # logging.DEBUG for per-frame mission output
+logger = logging.getLogger('MoonRover')
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler(sys.stdout))
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
 # New Modules
 try:
     from gamepad_control import GamepadController
 except ImportError:
     GamepadController = None
-    print("WARNING: gamepad_control module not found.")
+    logger.warning("gamepad_control module not found.")
 
 # --- Configuration ---
 SERVER_IP = "192.168.1.8" 
@@ -29,61 +45,39 @@ API_HIRES_CAPTURE = f"{SERVER_URL}/hires_capture"
 # Driving Parameters
 SPD_NORMAL = 0.22      
 
-# --- Helper Classes ---
+# JPEG encoder params, built once (baseline JPEG, no Huffman optimize pass)
+STREAM_JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 50, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+HIRES_JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 95, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
 
-class TelemetrySender:
-    """Async sender to stream frame + telemetry to the Laptop"""
-    def __init__(self):
-        self.latest_data = None
-        self.lock = threading.Lock()
-        self.running = True
-        self.thread = threading.Thread(target=self._run_loop, daemon=True)
-        self.thread.start()
-    
-    def update(self, data):
-        with self.lock:
-            self.latest_data = data
-    
-    def _run_loop(self):
-        while self.running:
-            data_to_send = None
-            with self.lock:
-                if self.latest_data:
-                    data_to_send = self.latest_data
-                    self.latest_data = None
-            
-            if data_to_send:
-                try:
-                    # Posting to the laptop server
-                    requests.post(API_TELEMETRY, data=data_to_send, timeout=0.15)
-                except Exception as e:
-                    # print(f"Telemetry Send Error: {e}")
-                    pass
-            else:
-                time.sleep(0.01)
+# Server command polling (background thread)
+COMMAND_POLL_INTERVAL = 0.1  # Seconds between /jetson_command polls
+COMMAND_TIMEOUT = 0.5        # Zero server drive if no good poll for this long
 
-    def stop(self):
-        self.running = False
+# Control loop scheduling (Linux, best effort)
+CONTROL_CPU = 2              # Core the main loop is pinned to
+CONTROL_NICE = -5            # Niceness boost (SCHED_OTHER, so the gamepad
+                             # reader is never starved the way SCHED_FIFO could)
 
 
 class MoonRoverBrain:
     def __init__(self):
-        print(">> Initializing Moon Rover Brain (Lightweight Refactor)...")
+        logger.info(">> Initializing Moon Rover Brain (Lightweight Refactor)...")
         
         # 1. Setup Systems
         self.car = NvidiaRacecar()
         self.car.steering_gain = 0.65
         self.car.steering_offset = 0.3
-        self.telemetry = TelemetrySender()
+        self.http = make_http_session()
+        self.telemetry = TelemetrySender(API_TELEMETRY, timeout=0.15, session=self.http)
         
         # Gamepad (Direct Control on Rover)
         self.gamepad = None
         if GamepadController:
             self.gamepad = GamepadController()
             self.gamepad.start()
-            print("✓ Gamepad Controller Started")
+            logger.info("✓ Gamepad Controller Started")
         else:
-            print("! NO GAMEPAD FOUND. Rover is immobile without gamepad.")
+            logger.warning("! NO GAMEPAD FOUND. Rover is immobile without gamepad.")
 
         # 2. Setup Camera (Jetracer Config) - Output 720p, resize for streaming
         gst = ("nvarguscamerasrc sensor-id=0 ! "
@@ -94,11 +88,13 @@ class MoonRoverBrain:
         
         self.cam = cv2.VideoCapture(gst, cv2.CAP_GSTREAMER)
         if not self.cam.isOpened():
-             print("WARNING: GStreamer failed, failing back to V4L2")
+             logger.warning("GStreamer failed, failing back to V4L2")
              self.cam = cv2.VideoCapture(0)
         
         # Stream resolution (resize from 720p for bandwidth)
         self.stream_size = (416, 416)
+        # Reused resize target (H, W, BGR) so streaming allocates no frame per loop
+        self.stream_buf = np.empty((self.stream_size[1], self.stream_size[0], 3), dtype=np.uint8)
              
         # 3. State
         # 3. State
@@ -107,13 +103,17 @@ class MoonRoverBrain:
         self.steering_raw = 0.0
         self.server_throttle = 0.0
         self.server_steering = 0.0
+        # Latest poll result as one tuple (throttle, steering, monotonic stamp),
+        # replaced atomically by the command thread
+        self._server_cmd = (0.0, 0.0, 0.0)
+        self.capture_requested = threading.Event()
         
         atexit.register(self.cleanup)
         signal.signal(signal.SIGINT, self._signal_handler)
-        print("✓ System Ready. Waiting for Gamepad Input...")
+        logger.info("✓ System Ready. Waiting for Gamepad Input...")
 
     def cleanup(self):
-        print("Cleaning up...")
+        logger.info("Cleaning up...")
         self.set_drive(0, 0)
         self.telemetry.stop()
         if self.gamepad: 
@@ -124,11 +124,13 @@ class MoonRoverBrain:
     def _signal_handler(self, sig, frame):
         self.is_running = False
         self.cleanup()
+        _log_listener.stop()  # os._exit skips atexit; flush queued log lines
         os._exit(0)
 
     def set_drive(self, throttle, steering):
-        steering = max(-1.0, min(1.0, steering))
-        throttle = max(-1.0, min(1.0, throttle))
+        # Inline clamps to [-1, 1] (no min/max call overhead per tick)
+        steering = -1.0 if steering < -1.0 else (1.0 if steering > 1.0 else steering)
+        throttle = -1.0 if throttle < -1.0 else (1.0 if throttle > 1.0 else throttle)
         self.throttle_val = throttle
         self.car.throttle = throttle  # No negation - negative values go forward
         self.car.steering = -steering
@@ -136,33 +138,73 @@ class MoonRoverBrain:
     def send_hires_capture(self, frame):
         """Send a high-res frame to the server"""
         try:
-            _, jpg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-            payload = {'hires_image': base64.b64encode(jpg).decode()}
-            requests.post(API_HIRES_CAPTURE, data=payload, timeout=2.0)
-            print(">> HiRes Capture Sent!")
+            _, jpg = cv2.imencode('.jpg', frame, HIRES_JPEG_PARAMS)
+            files = {'hires_image': ('hires.jpg', jpg.tobytes(), 'image/jpeg')}
+            self.http.post(API_HIRES_CAPTURE, files=files, timeout=2.0)
+            logger.info(">> HiRes Capture Sent!")
         except Exception as e:
-            print(f"HiRes Capture Error: {e}")
+            logger.error("HiRes Capture Error: %s", e)
     
     def update_server_command(self):
         """Check for server commands (driving + capture)"""
         try:
-            resp = requests.get(API_COMMAND, timeout=0.1)
+            resp = self.http.get(API_COMMAND, timeout=0.1)
             data = resp.json()
             
             # Update driving command
-            self.server_throttle = float(data.get('throttle', 0.0))
-            self.server_steering = float(data.get('steering', 0.0))
+            self._server_cmd = (float(data.get('throttle', 0.0)),
+                                float(data.get('steering', 0.0)),
+                                time.monotonic())
             
             return data.get('capture', False)
         except:
             # Failsafe: Stop rover if communication is lost
-            self.server_throttle = 0.0
-            self.server_steering = 0.0
+            self._server_cmd = (0.0, 0.0, time.monotonic())
             return False
 
+    def _pin_control_thread(self):
+        """Pin the calling (main loop) thread to CONTROL_CPU and raise its niceness.
+
+        On Linux both calls apply to the calling thread only, so threads
+        started earlier (GStreamer, telemetry, gamepad) keep their defaults,
+        but any thread created later from this one inherits the pin and
+        niceness; run() warms up OpenCV's worker pool before calling this.
+        A negative nice needs root or CAP_SYS_NICE; otherwise it is skipped.
+        """
+        if not hasattr(os, 'sched_setaffinity'):
+            return
+        try:
+            if CONTROL_CPU in os.sched_getaffinity(0):
+                os.sched_setaffinity(0, {CONTROL_CPU})
+                logger.info(">> Main loop pinned to CPU %d", CONTROL_CPU)
+        except OSError as e:
+            logger.warning("CPU pinning failed: %s", e)
+        try:
+            os.nice(CONTROL_NICE)
+            logger.info(">> Main loop niceness raised")
+        except OSError:
+            pass  # Unprivileged: keep default scheduling
+
+    def _command_loop(self):
+        """Poll server commands off the control loop."""
+        while self.is_running:
+            if self.update_server_command():
+                self.capture_requested.set()
+            time.sleep(COMMAND_POLL_INTERVAL)
+
     def run(self):
-        print(">> Starting Main Loop...")
+        logger.info(">> Starting Main Loop...")
         self.is_running = True
+        threading.Thread(target=self._command_loop, daemon=True).start()
+        # OpenCV creates its worker pool lazily on first use; run one
+        # full-size resize + encode now so the pool is sized and spawned on
+        # all cores rather than inheriting the control-core pin below
+        warmup = np.zeros((720, 1280, 3), dtype=np.uint8)
+        cv2.imencode('.jpg', cv2.resize(warmup, self.stream_size, dst=self.stream_buf),
+                     STREAM_JPEG_PARAMS)
+        # After spawning the poller and OpenCV's pool so neither inherits
+        # the pin/priority
+        self._pin_control_thread()
         
         frame_counter = 0
         
@@ -176,9 +218,16 @@ class MoonRoverBrain:
             frame_counter += 1
 
             # --- 2. Update Remote Command (Server) ---
-            if frame_counter % 5 == 0: # Check every 5 frames (~6Hz)
-                if self.update_server_command():
-                    self.send_hires_capture(frame)
+            # Polled by _command_loop; watchdog drops a stale command
+            throttle, steering, stamp = self._server_cmd
+            if time.monotonic() - stamp > COMMAND_TIMEOUT:
+                throttle = steering = 0.0
+            self.server_throttle = throttle
+            self.server_steering = steering
+            
+            if self.capture_requested.is_set():
+                self.capture_requested.clear()
+                self.send_hires_capture(frame)
 
             # --- 3. Driving Logic ---
             # Priority: Server Mission > Gamepad
@@ -187,7 +236,7 @@ class MoonRoverBrain:
                  self.set_drive(self.server_throttle, self.server_steering)
                  self.steering_raw = self.server_steering
                  if frame_counter % 30 == 0: # Log less frequently
-                    print(f"Mission Control: Spd={self.server_throttle:.2f} Str={self.server_steering:.2f}")
+                    logger.debug("Mission Control: Spd=%.2f Str=%.2f", self.server_throttle, self.server_steering)
             elif self.gamepad:
                 g_throt, g_steer = self.gamepad.get_drive_command()
                 self.set_drive(g_throt, g_steer)
@@ -198,23 +247,23 @@ class MoonRoverBrain:
             
             # --- 3. Telemetry Streaming (Send to Laptop) ---
             # Resize to 416x416 for streaming
-            stream_frame = cv2.resize(frame, self.stream_size)
+            stream_frame = cv2.resize(frame, self.stream_size, dst=self.stream_buf)
             
             # Send every frame
             if frame_counter % 1 == 0:
-                _, jpg = cv2.imencode('.jpg', stream_frame, [cv2.IMWRITE_JPEG_QUALITY, 50])
+                _, jpg = cv2.imencode('.jpg', stream_frame, STREAM_JPEG_PARAMS)
                 
-                # Payload: Image + Rover State
+                # Payload: Rover State + raw JPEG as a multipart file
                 payload = {
-                    'img_base64': base64.b64encode(jpg).decode(),
                     'throttle': self.throttle_val,
                     'steer_real': self.steering_raw,
                     'racer': 'run'
                 }
-                self.telemetry.update(payload)
-                
-            # Loop Rate
-            time.sleep(0.005)
+                files = {'img': ('frame.jpg', jpg.tobytes(), 'image/jpeg')}
+                self.telemetry.update(payload, files)
+            
+            # No sleep: cam.read() blocks until the next frame (appsink
+            # drop=true max-buffers=1), which paces the loop at camera rate
 
 if __name__ == "__main__":
     bot = MoonRoverBrain()
@@ -16,15 +16,28 @@ JSON Command Reference (ESP32):
 
 import time
 import threading
+import collections
 import json
+import queue
+import select
 import serial
 import cv2
-import requests
-import base64
 import signal
 import os
 import atexit
 
+from telemetry_sender import TelemetrySender, put_latest
+
+# Fast JSON codec when available (both give compact UTF-8 bytes)
+try:
+    import orjson
+    _json_bytes = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_bytes(obj):
+        return json.dumps(obj, separators=(',', ':')).encode()
+    _json_loads = json.loads
+
 # Import UGV Gamepad Controller
 try:
     from gamepad_control_ugv import UGVGamepadController
@@ -45,6 +58,27 @@ SERIAL_BAUD = 115200
 CAMERA_ID = 0
 FRAME_WIDTH = 640
 FRAME_HEIGHT = 480
+# JPEG encoder params, built once (baseline JPEG, no Huffman optimize pass)
+STREAM_JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 50, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+
+# ESP32 command coalescing (see CommandCoalescer)
+COMMAND_MIN_INTERVAL = 0.02  # At most one send pass per 20 ms (50 Hz)
+CHASSIS_KEEPALIVE = 0.5      # Resend unchanged chassis speeds this often
+
+# Pre-encoded command templates (no dict/JSON per call); see the
+# JSON Command Reference above
+_CHASSIS_CMD = b'{"T":1,"L":%.3f,"R":%.3f}\n'
+_PTZ_DIR_CMD = b'{"T":201,"X":%d,"Y":%d,"SPD":%d}\n'
+_PTZ_ANGLE_CMD = b'{"T":202,"X":%g,"Y":%g,"SPD":%d}\n'
+_LED_CMD = b'{"T":301,"SW1":%d,"SW2":%d,"BR":%d}\n'
+_FEEDBACK_CMD = b'{"T":901}\n'
+
+RX_BUFFER_MAX = 4096  # Drop unterminated ESP32 output beyond this many bytes
+FEEDBACK_QUEUE_LEN = 16  # Parsed ESP32 messages kept for the control loop
+TX_QUEUE_LEN = 64        # Encoded commands waiting for the writer thread
+RX_READ_SIZE = 1024      # Max bytes per os.read of the UART
+SERIAL_IO_TIMEOUT = 0.1  # select() timeout for the reader/writer threads
+SERIAL_ERROR_REPORT_INTERVAL = 5.0  # Seconds between UART write-error reports
 
 
 class ESP32Controller:
@@ -58,7 +92,16 @@ class ESP32Controller:
         self.baud = baud
         self.serial = None
         self.connected = False
-        self.lock = threading.Lock()
+        # Commands are encoded by the callers and written by one writer
+        # thread, so senders never block on the UART
+        self.tx_queue = queue.Queue(maxsize=TX_QUEUE_LEN)
+        self.writer_thread = None
+        self._rx_buf = bytearray()  # ESP32 output not yet split into lines
+        # Parsed messages from the reader thread (deque append/popleft are
+        # thread-safe; oldest dropped when full)
+        self.feedback = collections.deque(maxlen=FEEDBACK_QUEUE_LEN)
+        self.reader_thread = None
+        self._fd = -1  # Raw UART descriptor; pyserial only configures the port
         
         # State cache
         self.battery_voltage = 0.0
@@ -74,7 +117,14 @@ class ESP32Controller:
                 baudrate=self.baud,
                 timeout=0.1
             )
+            # Threads use os.read/os.write on the descriptor directly,
+            # skipping pyserial's per-call Python layer
+            self._fd = self.serial.fileno()
             self.connected = True
+            self.reader_thread = threading.Thread(target=self._reader_loop, daemon=True)
+            self.reader_thread.start()
+            self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+            self.writer_thread.start()
             print(f"[ESP32] Connected to {self.port}")
             return True
         except Exception as e:
@@ -83,37 +133,79 @@ class ESP32Controller:
             return False
     
     def disconnect(self):
+        self.connected = False
+        if self.writer_thread:
+            # Sentinel goes after queued commands (e.g. the final stop). If
+            # the UART has stalled with the queue full, drop the oldest
+            # command rather than block shutdown
+            try:
+                self.tx_queue.put(None, timeout=0.5)
+            except queue.Full:
+                put_latest(self.tx_queue, None)
+            self.writer_thread.join(timeout=1.0)
+        if self.reader_thread:
+            self.reader_thread.join(timeout=0.5)  # Exits within one read timeout
         if self.serial and self.serial.is_open:
             self.serial.close()
         self.connected = False
     
     def send_command(self, cmd_dict):
         """Send a JSON command to ESP32."""
+        return self.send_line(_json_bytes(cmd_dict) + b"\n")
+    
+    def send_line(self, line):
+        """Queue one pre-encoded, newline-terminated command (non-blocking)."""
         if not self.connected:
             return False
         
         try:
-            with self.lock:
-                cmd_json = json.dumps(cmd_dict) + "\n"
-                self.serial.write(cmd_json.encode())
-                self.serial.flush()
+            self.tx_queue.put_nowait(line)
             return True
-        except Exception as e:
-            print(f"[ESP32] Send error: {e}")
+        except queue.Full:
+            print("[ESP32] Send error: TX queue full")
             return False
     
+    def _writer_loop(self):
+        """Write queued commands to the UART until the None sentinel."""
+        errors = 0
+        last_report = -SERIAL_ERROR_REPORT_INTERVAL
+        while True:
+            line = self.tx_queue.get()
+            if line is None:
+                break
+            try:
+                # No flush(): it is tcdrain() and would block until the UART
+                # has shifted every byte out
+                self._write_all(line)
+            except Exception as e:
+                # Report at most once per interval, with the count in between
+                errors += 1
+                now = time.monotonic()
+                if now - last_report >= SERIAL_ERROR_REPORT_INTERVAL:
+                    print(f"[ESP32] Send error ({errors}x): {e}")
+                    errors = 0
+                    last_report = now
+    
+    def _write_all(self, data):
+        """os.write the whole buffer (pyserial opens the port non-blocking)."""
+        fd = self._fd
+        view = memoryview(data)
+        while view:
+            try:
+                n = os.write(fd, view)
+            except BlockingIOError:
+                # Kernel TX buffer full: wait until it drains a little
+                select.select([], [fd], [], SERIAL_IO_TIMEOUT)
+                continue
+            view = view[n:]
+    
     def set_chassis(self, left_speed, right_speed):
         """
         Set wheel speeds.
         left_speed, right_speed: -1.0 to 1.0 (will be scaled to m/s)
         """
         # Scale to actual speed (max 0.35 m/s for UGV Beast)
-        cmd = {
-            "T": 1,
-            "L": round(left_speed, 3),
-            "R": round(right_speed, 3)
-        }
-        return self.send_command(cmd)
+        return self.send_line(_CHASSIS_CMD % (left_speed, right_speed))
     
     def set_ptz_direction(self, pan, tilt, speed=50):
         """
@@ -122,13 +214,7 @@ class ESP32Controller:
         tilt: -1 (down), 0 (stop), 1 (up)
         speed: 0-100
         """
-        cmd = {
-            "T": 201,
-            "X": pan,
-            "Y": tilt,
-            "SPD": speed
-        }
-        return self.send_command(cmd)
+        return self.send_line(_PTZ_DIR_CMD % (pan, tilt, speed))
     
     def set_ptz_angle(self, pan_angle, tilt_angle, speed=50):
         """
@@ -136,13 +222,7 @@ class ESP32Controller:
         pan_angle: -180 to +180
         tilt_angle: -45 to +90
         """
-        cmd = {
-            "T": 202,
-            "X": pan_angle,
-            "Y": tilt_angle,
-            "SPD": speed
-        }
-        return self.send_command(cmd)
+        return self.send_line(_PTZ_ANGLE_CMD % (pan_angle, tilt_angle, speed))
     
     def center_ptz(self):
         """Reset PTZ to center position."""
@@ -155,13 +235,9 @@ class ESP32Controller:
         chassis_led: True/False (chassis underglow)
         brightness: 0-100
         """
-        cmd = {
-            "T": 301,
-            "SW1": 1 if chassis_led else 0,
-            "SW2": 1 if main_led else 0,
-            "BR": brightness
-        }
-        return self.send_command(cmd)
+        return self.send_line(_LED_CMD % (1 if chassis_led else 0,
+                                          1 if main_led else 0,
+                                          brightness))
     
     def stop(self):
         """Emergency stop - all motors off."""
@@ -169,55 +245,129 @@ class ESP32Controller:
         self.set_ptz_direction(0, 0, 0)
     
     def get_feedback(self):
-        """Request feedback data from ESP32."""
-        cmd = {"T": 901}
-        self.send_command(cmd)
+        """
+        Request feedback data from ESP32.
+        Non-blocking: returns the newest message the reader thread has
+        parsed since the last call (the reply to this request arrives later).
+        """
+        self.send_line(_FEEDBACK_CMD)
         
-        # Read response
-        try:
-            if self.serial.in_waiting:
-                line = self.serial.readline().decode().strip()
-                if line:
-                    data = json.loads(line)
-                    self.battery_voltage = data.get('battery', 0)
-                    return data
-        except:
-            pass
-        return None
+        data = None
+        while self.feedback:
+            data = self.feedback.popleft()
+        return data
+    
+    def _reader_loop(self):
+        """Read ESP32 output off the control loop and queue parsed messages."""
+        fd = self._fd
+        while self.connected:
+            try:
+                # Wait for input, then take everything waiting in one read
+                readable, _, _ = select.select([fd], [], [], SERIAL_IO_TIMEOUT)
+                if not readable:
+                    continue
+                chunk = os.read(fd, RX_READ_SIZE)
+            except BlockingIOError:
+                continue
+            except Exception:
+                if self.connected:
+                    time.sleep(SERIAL_IO_TIMEOUT)
+                continue
+            if chunk:
+                self._parse_rx(chunk)
+            else:
+                time.sleep(SERIAL_IO_TIMEOUT)  # Readable but empty: port hung up
+    
+    def _parse_rx(self, chunk):
+        """Append raw bytes; parse every complete line, keep any partial one."""
+        buf = self._rx_buf
+        buf += chunk
+        end = buf.rfind(b"\n")
+        if end < 0:
+            if len(buf) > RX_BUFFER_MAX:
+                buf.clear()
+            return
+        lines = buf[:end].split(b"\n")
+        del buf[:end + 1]
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = _json_loads(bytes(line))
+            except ValueError:
+                continue  # Boot noise / partial line
+            if isinstance(data, dict):
+                if 'battery' in data:
+                    self.battery_voltage = data['battery']
+                self.feedback.append(data)
 
 
-class TelemetrySender:
-    """Async sender to stream telemetry to the Laptop server."""
+class CommandCoalescer:
+    """
+    Latest-value slots for the continuous ESP32 commands (chassis, PTZ
+    direction). The control loop overwrites the slots every iteration; a
+    background thread sends a slot only when its value changed, plus a
+    periodic chassis keepalive so the ESP32 heartbeat never times out.
+    """
     
-    def __init__(self):
-        self.latest_data = None
-        self.lock = threading.Lock()
+    def __init__(self, esp32, keepalive=CHASSIS_KEEPALIVE):
+        self.esp32 = esp32
+        self.keepalive = keepalive
+        # Each slot is one tuple, replaced atomically by the setters
+        self.pending_chassis = (0.0, 0.0)
+        self.pending_ptz = (0, 0, 0)
+        self.wake = threading.Event()
         self.running = True
+        
         self.thread = threading.Thread(target=self._run_loop, daemon=True)
         self.thread.start()
     
-    def update(self, data):
-        with self.lock:
-            self.latest_data = data
+    def set_chassis(self, left_speed, right_speed):
+        cmd = (left_speed, right_speed)
+        if cmd != self.pending_chassis:
+            self.pending_chassis = cmd
+            self.wake.set()
+    
+    def set_ptz_direction(self, pan, tilt, speed=50):
+        cmd = (pan, tilt, speed)
+        if cmd != self.pending_ptz:
+            self.pending_ptz = cmd
+            self.wake.set()
+    
+    def stop(self):
+        """Zero both slots (sent on the next pass)."""
+        self.set_chassis(0.0, 0.0)
+        self.set_ptz_direction(0, 0, 0)
+    
+    def close(self):
+        self.running = False
+        self.wake.set()
+        self.thread.join(timeout=1.0)
     
     def _run_loop(self):
+        sent_chassis = sent_ptz = None
+        last_chassis_time = 0.0
         while self.running:
-            data_to_send = None
-            with self.lock:
-                if self.latest_data:
-                    data_to_send = self.latest_data
-                    self.latest_data = None
+            # Sleep until a slot changes, or until the keepalive is due
+            self.wake.wait(timeout=self.keepalive)
+            self.wake.clear()
+            if not self.running:
+                break
             
-            if data_to_send:
-                try:
-                    requests.post(API_TELEMETRY, data=data_to_send, timeout=0.2)
-                except Exception as e:
-                    pass
-            else:
-                time.sleep(0.01)
-
-    def stop(self):
-        self.running = False
+            chassis = self.pending_chassis
+            ptz = self.pending_ptz
+            now = time.monotonic()
+            if chassis != sent_chassis or now - last_chassis_time >= self.keepalive:
+                self.esp32.set_chassis(*chassis)
+                sent_chassis = chassis
+                last_chassis_time = now
+            if ptz != sent_ptz:
+                self.esp32.set_ptz_direction(*ptz)
+                sent_ptz = ptz
+            
+            # Rate-limit the UART; changes meanwhile are coalesced
+            time.sleep(COMMAND_MIN_INTERVAL)
 
 
 class UGVBrain:
@@ -235,9 +385,11 @@ class UGVBrain:
         self.esp32 = ESP32Controller()
         if not self.esp32.connect():
             print("WARNING: ESP32 not connected. Running in simulation mode.")
+        # Chassis/PTZ go through the coalescer; one-shot commands go direct
+        self.commands = CommandCoalescer(self.esp32)
         
         # 2. Setup Telemetry Sender
-        self.telemetry = TelemetrySender()
+        self.telemetry = TelemetrySender(API_TELEMETRY, timeout=0.2)
         
         # 3. Setup Gamepad
         self.gamepad = None
@@ -266,14 +418,22 @@ class UGVBrain:
                 
             print("[Brain] Camera (GStreamer) initialized")
         except:
-            # Fallback to V4L2
+            # Fallback to V4L2. Ask the USB camera for its native MJPEG (set
+            # before the frame size); only if it was accepted, skip OpenCV's
+            # decode to BGR so read() returns the camera's JPEG as-is
             self.cam = cv2.VideoCapture(CAMERA_ID)
+            mjpg = cv2.VideoWriter_fourcc(*'MJPG')
+            self.cam.set(cv2.CAP_PROP_FOURCC, mjpg)
+            if int(self.cam.get(cv2.CAP_PROP_FOURCC)) == mjpg:
+                self.cam.set(cv2.CAP_PROP_CONVERT_RGB, 0)
             self.cam.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
             self.cam.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
             print("[Brain] Camera (V4L2) initialized")
         
         # 5. State
         self.is_running = False
+        # Latest (frame, payload) for the encoder thread; older ones are dropped
+        self.frame_queue = queue.Queue(maxsize=1)
         self.current_left_speed = 0.0
         self.current_right_speed = 0.0
         self.main_led_state = False
@@ -289,13 +449,16 @@ class UGVBrain:
     def cleanup(self):
         print("\n[Brain] Cleaning up...")
         
-        # Stop motors
+        # Stop motors (coalescer first so it can't resend a stale speed)
+        self.commands.close()
         if self.esp32.connected:
             self.esp32.stop()
             self.esp32.set_leds(False, False)
             self.esp32.disconnect()
         
         # Stop threads
+        self.is_running = False
+        put_latest(self.frame_queue, None)  # Wake the encoder so it exits
         self.telemetry.stop()
         if self.gamepad:
             self.gamepad.stop()
@@ -309,10 +472,34 @@ class UGVBrain:
         self.cleanup()
         os._exit(0)
 
+    def _encode_loop(self):
+        """JPEG-encode queued frames off the control loop and hand them to telemetry."""
+        while self.is_running:
+            item = self.frame_queue.get()
+            if item is None:
+                continue
+            frame, payload = item
+            if frame.ndim == 3 and frame.shape[2] == 3:
+                try:
+                    ok, jpg = cv2.imencode('.jpg', frame, STREAM_JPEG_PARAMS)
+                except cv2.error as e:
+                    print(f"[Brain] Frame encode error: {e}")
+                    continue
+                if not ok:
+                    continue
+            elif frame.ndim <= 2:
+                jpg = frame  # Already-encoded MJPEG buffer (V4L2 passthrough)
+            else:
+                continue  # Undecoded raw format (e.g. YUYV); nothing to send
+            # Raw JPEG as a multipart file (no base64 inflation)
+            files = {'img': ('frame.jpg', jpg.tobytes(), 'image/jpeg')}
+            self.telemetry.update(payload, files)
+
     def run(self):
         """Main control loop."""
         print("[Brain] Starting main loop...")
         self.is_running = True
+        threading.Thread(target=self._encode_loop, daemon=True).start()
         
         frame_counter = 0
         last_feedback_time = time.time()
@@ -322,7 +509,7 @@ class UGVBrain:
             if self.gamepad:
                 # Emergency stop check
                 if self.gamepad.is_emergency_stop():
-                    self.esp32.stop()
+                    self.commands.stop()
                     self.current_left_speed = 0
                     self.current_right_speed = 0
                 else:
@@ -330,11 +517,11 @@ class UGVBrain:
                     left, right = self.gamepad.get_chassis_command()
                     self.current_left_speed = left
                     self.current_right_speed = right
-                    self.esp32.set_chassis(left, right)
+                    self.commands.set_chassis(left, right)
                     
                     # PTZ control
                     pan, tilt, ptz_spd = self.gamepad.get_ptz_command()
-                    self.esp32.set_ptz_direction(pan, tilt, ptz_spd)
+                    self.commands.set_ptz_direction(pan, tilt, ptz_spd)
                     
                     # Center PTZ
                     if self.gamepad.should_center_ptz():
@@ -361,11 +548,10 @@ class UGVBrain:
                 last_feedback_time = time.time()
             
             # --- 4. Send Telemetry to Laptop (every 3rd frame) ---
+            # State is sampled here; JPEG encoding runs on _encode_loop.
+            # cam.read() returns a fresh array, so the frame needs no copy
             if frame_counter % 3 == 0:
-                _, jpg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 50])
-                
                 payload = {
-                    'img_base64': base64.b64encode(jpg).decode(),
                     'throttle': (self.current_left_speed + self.current_right_speed) / 2,
                     'steer_real': (self.current_right_speed - self.current_left_speed),
                     'left_speed': self.current_left_speed,
@@ -375,7 +561,7 @@ class UGVBrain:
                     'chassis_led': self.chassis_led_state,
                     'racer': 'run'
                 }
-                self.telemetry.update(payload)
+                put_latest(self.frame_queue, (frame, payload))
             
             # Loop rate control
             time.sleep(0.01)
@@ -1,7 +1,6 @@
 import os
 import json
 import logging
-import base64
 import cv2
 import numpy as np
 import time
@@ -10,6 +9,12 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO
 
+# SIMD base64 when available (same b64encode/b64decode API)
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
 # Import Smart Modules
 try:
     from vision_system import VisionSystem
@@ -48,11 +53,18 @@ broadcast_event = Event()
 state_lock = Lock()
 
 last_telemetry_time = time.time()
-yolo_frame_counter = 0
 cached_craters = []
 cached_annotated_b64 = None
 cached_raw_frame = None  # Store raw frame for capture endpoint
 
+# YOLO worker: /display hands over the newest frame, vision_loop publishes
+# results; frames that arrive while YOLO is busy are dropped (latest wins)
+vision_lock = Lock()
+vision_event = Event()
+pending_vision_frame = None
+vision_result_seq = 0  # Bumped per YOLO result
+fused_result_seq = 0   # Last result consumed by /display (map, mission log, capture)
+
 # High-res capture state
 capture_pending = False
 capture_metadata = {}  # {"box": [...], "label": "..."}
@@ -226,48 +238,50 @@ def receive_telemetry():
     last_telemetry_time = current_time
     
     # 1. Extract Raw Data from Rover
-    img_b64_raw = request.form.get('img_base64', '')
+    # JPEG arrives as a raw multipart file ('img'); older senders post base64
+    img_file = request.files.get('img')
+    img_bytes = img_file.read() if img_file else b''
+    img_b64_raw = '' if img_file else request.form.get('img_base64', '')
     throttle = request.form.get('throttle', type=float, default=0.0)*(-1)
     steer_real = request.form.get('steer_real', type=float, default=0.0)
     
     # Decode Image
     img = None
-    if img_b64_raw and vision:
+    if vision and (img_bytes or img_b64_raw):
         try:
-            # Fix padding if necessary (though usually standard b64 is fine)
-            img_bytes = base64.b64decode(img_b64_raw)
+            if not img_bytes:
+                img_bytes = base64.b64decode(img_b64_raw)  # Legacy sender
             nparr = np.frombuffer(img_bytes, np.uint8)
             img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         except Exception as e:
             logger.error(f"Image Decode Error: {e}")
 
     # 2. Run Laptop-Side Perception
-    global yolo_frame_counter, cached_craters, cached_annotated_b64, cached_raw_frame
-    
-    # A. Vision (Object Detection) - Run YOLO every 5th frame for performance
-    live_craters = cached_craters
-    annotated_b64 = img_b64_raw  # Default to raw image
+    global pending_vision_frame, fused_result_seq
     
+    # A. Vision (Object Detection) - YOLO runs in vision_loop; queue this frame
+    # and use the latest finished result
     if img is not None:
-        yolo_frame_counter += 1
-        
-        if vision and yolo_frame_counter % 1 == 0:  # Real-time: every frame
-            # Run YOLO on this frame
-            live_craters, annotated_frame = vision.process_frame(img)
-            cached_craters = live_craters
-            cached_raw_frame = img.copy()  # Cache raw frame for capture
-            
-            # Re-encode annotated image for the Dashboard
-            _, buf = cv2.imencode('.jpg', annotated_frame, [cv2.IMWRITE_JPEG_QUALITY, 60])
-            cached_annotated_b64 = base64.b64encode(buf).decode()
-            annotated_b64 = cached_annotated_b64
-        elif cached_annotated_b64:
-            # Use cached YOLO output for non-YOLO frames
-            annotated_b64 = cached_annotated_b64
+        with vision_lock:
+            pending_vision_frame = img
+        vision_event.set()
+    
+    with vision_lock:
+        live_craters = cached_craters
+        raw_frame = cached_raw_frame  # Frame live_craters was detected on
+        result_seq = vision_result_seq
+        annotated_b64 = cached_annotated_b64
+        # Claim each YOLO result for exactly one request, so concurrent
+        # handlers never fuse, log or capture the same result twice
+        new_result = img is not None and result_seq != fused_result_seq
+        if new_result:
+            fused_result_seq = result_seq
+    if annotated_b64 is None:
+        # Raw image until YOLO reports
+        if img_b64_raw:
+            annotated_b64 = img_b64_raw  # Already base64; no decode/re-encode
         else:
-            # No YOLO yet, just send raw frame with minimal re-encode
-            _, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 60])
-            annotated_b64 = base64.b64encode(buf).decode()
+            annotated_b64 = base64.b64encode(img_bytes).decode() if img_bytes else ''
 
     # B. Mapping (SLAM)
     map_status = {'pose': {'x':0,'y':0,'theta':0}, 'craters': []}
@@ -276,9 +290,9 @@ def receive_telemetry():
         # Update Pose (Dead Reckoning)
         mapper.update_pose(throttle, steer_real, dt)
         
-        # Update Map with new crater detections
+        # Update Map with new crater detections (each YOLO result once)
         # Note: Vision returns 'box' and 'depth'. Mapper needs this.
-        if img is not None:
+        if new_result:
              h, w = img.shape[:2]
              mapper.update_craters(live_craters, w)
              
@@ -305,7 +319,8 @@ def receive_telemetry():
         # Log all detections during mission for debugging
         mission_log_path = f"public/reports/{mission_manager.mission_folder}/mission_log.txt" if mission_manager.mission_folder else "mission_log.txt"
         
-        if live_craters:
+        # Log and capture once per YOLO result, not once per request
+        if new_result and live_craters:
             with open(mission_log_path, 'a') as mlog:
                 mlog.write(f"\n[{time.strftime('%H:%M:%S')}] Frame - Dist: {mission_manager.current_distance:.3f}m, Progress: {mission_manager.progress}%\n")
                 mlog.write(f"  Detections: {len(live_craters)}, Already Captured IDs: {mission_manager.captured_track_ids}\n")
@@ -330,7 +345,7 @@ def receive_telemetry():
                     else:
                         mlog.write(f"      -> ELIGIBLE for capture!\n")
         
-        if live_craters and cached_raw_frame is not None:
+        if new_result and live_craters and raw_frame is not None:
             for target in live_craters:
                 track_id = target.get('track_id')
                 depth = target.get('depth', 0.0)
@@ -342,7 +357,7 @@ def receive_telemetry():
                 # Only capture when in optimal distance range
                 if CAPTURE_MIN_DIST <= depth <= CAPTURE_MAX_DIST:
                     # Perform Instant Server-Side Capture
-                    capture_success = process_server_capture(cached_raw_frame, target)
+                    capture_success = process_server_capture(raw_frame, target)
                     
                     if capture_success:
                         mission_manager.captured_track_ids.add(track_id)
@@ -400,9 +415,44 @@ def broadcast_loop():
             # Emit to frontend
             socketio.emit('telemetry_update', data_to_send)
 
-# Start Background Thread
+def vision_loop():
+    """Run YOLO on the newest frame from /display, off the request path."""
+    global pending_vision_frame, vision_result_seq
+    global cached_craters, cached_annotated_b64, cached_raw_frame
+    while True:
+        vision_event.wait()
+        vision_event.clear()
+        
+        with vision_lock:
+            img = pending_vision_frame
+            pending_vision_frame = None
+        if img is None:
+            continue
+        
+        try:
+            live_craters, annotated_frame = vision.process_frame(img)
+            
+            # Re-encode annotated image for the Dashboard
+            _, buf = cv2.imencode('.jpg', annotated_frame, [cv2.IMWRITE_JPEG_QUALITY, 60])
+            annotated_b64 = base64.b64encode(buf).decode()
+        except Exception as e:
+            logger.error(f"Vision Error: {e}")
+            continue
+        
+        with vision_lock:
+            cached_craters = live_craters
+            # Cache raw frame for capture. No copy: each request decodes a fresh
+            # array, and process_frame draws on its own copy
+            cached_raw_frame = img
+            cached_annotated_b64 = annotated_b64
+            vision_result_seq += 1
+
+# Start Background Threads
 bg_thread = Thread(target=broadcast_loop, daemon=True)
 bg_thread.start()
+if vision:
+    vision_thread = Thread(target=vision_loop, daemon=True)
+    vision_thread.start()
 
 @socketio.on('connect')
 def handle_connect():
@@ -469,12 +519,14 @@ def receive_hires_capture():
     """Receive high-res capture from rover and save cropped ROI"""
     global capture_metadata
     
-    img_b64 = request.form.get('hires_image', '')
-    if not img_b64:
+    # Raw JPEG multipart file; older senders post it base64-encoded in the form
+    img_file = request.files.get('hires_image')
+    img_b64 = None if img_file else request.form.get('hires_image', '')
+    if not img_file and not img_b64:
         return jsonify({'status': 'error', 'message': 'No image data'}), 400
     
     try:
-        img_bytes = base64.b64decode(img_b64)
+        img_bytes = img_file.read() if img_file else base64.b64decode(img_b64)
         nparr = np.frombuffer(img_bytes, np.uint8)
         hires_frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     except Exception as e:
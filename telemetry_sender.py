@@ -0,0 +1,83 @@
+"""
+Telemetry uplink shared by the rover brains (JetRacer and UGV Beast PT).
+Streams the latest frame + state to the laptop server's /display endpoint
+from a background thread; older frames are dropped if the link is slow.
+"""
+
+import queue
+import threading
+import time
+
+import requests
+
+ERROR_REPORT_INTERVAL = 5.0  # Seconds between send-error reports while the link is down
+
+
+def make_http_session():
+    """Keep-alive session for all traffic to the laptop server."""
+    session = requests.Session()
+    # Telemetry, command polling and hi-res capture can overlap; no retries
+    # so a dead link fails fast into the failsafe paths
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+    session.mount('http://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
+
+
+def put_latest(q, item):
+    """Put item into a maxsize=1 queue, dropping the unsent one (latest wins)."""
+    try:
+        q.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        q.put_nowait(item)
+    except queue.Full:
+        pass
+
+
+class TelemetrySender:
+    """Async sender to stream frame + telemetry to the Laptop"""
+    def __init__(self, url, timeout=0.15, session=None):
+        self.url = url
+        self.timeout = timeout
+        # Single-slot mailbox: update() replaces any unsent frame (latest wins)
+        self.q = queue.Queue(maxsize=1)
+        self.running = True
+        
+        # Kept-alive connection to the laptop instead of a new TCP
+        # connection per frame
+        self.session = session or make_http_session()
+        
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.thread.start()
+    
+    def update(self, data, files=None):
+        """Queue form fields (and optional multipart files) as the next frame to send."""
+        put_latest(self.q, (data, files))
+    
+    def _run_loop(self):
+        errors = 0
+        last_report = -ERROR_REPORT_INTERVAL
+        while self.running:
+            # Blocks until a frame is queued; None is the stop() wake-up
+            data_to_send = self.q.get()
+            if data_to_send is None:
+                continue
+            
+            data, files = data_to_send
+            try:
+                # Posting to the laptop server
+                self.session.post(self.url, data=data, files=files, timeout=self.timeout)
+            except Exception as e:
+                # Report at most once per interval, with the count in between
+                errors += 1
+                now = time.monotonic()
+                if now - last_report >= ERROR_REPORT_INTERVAL:
+                    print(f"Telemetry Send Error ({errors}x): {e}")
+                    errors = 0
+                    last_report = now
+
+    def stop(self):
+        self.running = False
+        put_latest(self.q, None)